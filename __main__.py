@@ -1,4 +1,5 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from movieDataSet import MovieDataSet
 
 if __name__ == "__main__":
@@ -7,19 +8,26 @@ if __name__ == "__main__":
 
     #   Loading Initial dataset
     df = MovieDataSet(
-        filepath_or_buffer="movies_metadata.csv", low_memory=False)
+        filepath_or_buffer="movies_metadata.csv", low_memory=False, use_cache=True)
 
     #   Clean dataset
     df = df.clean_dataset()
 
-    #   Display unique movies count
-    df.get_unique_movies_count()
+    #   The queries and the export only read the dataset, so they run concurrently
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        #   Display unique movies count
+        unique_movies = executor.submit(df.get_unique_movies_count)
 
-    #   Display average rating by column
-    df.get_average_rating_by_column()
+        #   Display average rating by column
+        average_rating = executor.submit(df.get_average_rating_by_column)
 
-    #   Display count of movies per year
-    df.get_movies_per_year()
+        #   Display count of movies per year
+        movies_per_year = executor.submit(df.get_movies_per_year)
 
-    #   Export dataset as JSON file
-    df.save_json("cleaned_dataset.json", orient="records")
+        #   Export dataset as JSON file
+        saved = executor.submit(
+            df.save_json, "cleaned_dataset.json", orient="records")
+
+        #   Re-raise any error from the tasks
+        for future in (unique_movies, average_rating, movies_per_year, saved):
+            future.result()
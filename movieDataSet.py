@@ -1,23 +1,72 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyarrow import csv as pacsv
+import orjson
 import ast
+import json
 import logging
+import os
+import tempfile
+from pathlib import Path
 
 # Define constants
 COLUMN_ID = "id"
 COLUMN_VOTE_AVERAGE = "vote_average"
 COLUMN_GENRES = "genres"
 COLUMN_RELEASE_DATE = "release_date"
+COLUMN_RELEASE_YEAR = "release_year"
 
+# Module logger, the handlers are configured by the application
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
 
-class MovieDataSet(pd.DataFrame):
+# Type of the parsed 'genres' column, a list of {id, name} structs per movie
+GENRES_TYPE = pa.list_(pa.struct([("id", pa.int32()), ("name", pa.string())]))
+
+# String columns with few distinct values, stored as categoricals by clean_dataset
+CATEGORY_COLUMNS = ["original_language", "status"]
+
+# Number of rows serialized at a time by save_json
+JSON_BATCH_SIZE = 8192
+
+# Number of decimals of the floats written by save_json, the default of DataFrame.to_json
+JSON_DOUBLE_PRECISION = 10
+
+# Key of the Parquet cache metadata holding the arguments the cached dataset was built with
+CACHE_METADATA_KEY = b"moviedataset.cache"
+
+# Columns read from the CSV file, the remaining columns are never parsed
+CSV_COLUMNS = ["budget", "genres", "id", "original_language", "popularity", "release_date", "revenue",
+               "title", "vote_average", "vote_count"]
+
+# Types of the columns which are converted while parsing the CSV file, every column in
+# CSV_COLUMNS is listed so PyArrow does not have to infer them
+CSV_COLUMN_TYPES = {
+    "id": pa.int32(),
+    "popularity": pa.float32(),
+    "budget": pa.float64(),
+    "release_date": pa.timestamp("ns"),
+    "vote_count": pa.int32(),
+    "revenue": pa.int64(),
+    "vote_average": pa.float64(),
+    "genres": pa.string(),
+    "original_language": pa.string(),
+    "title": pa.string(),
+}
+
+
+class MovieDataSet:
     """
-    MovieDataSet extends a pandas DataFrame with additional functionality.
+    MovieDataSet wraps a pandas DataFrame with additional functionality.
 
-    This class extends a pandas DataFrame and adds custom methods to enhance its functionality.
+    This class holds a plain pandas DataFrame and adds custom methods to query, clean and export it.
     """
 
-    def __init__(self, data=None, index=None, columns=None, filepath_or_buffer=None, low_memory=False, encoding="utf-8"):
+    def __init__(self, data=None, index=None, columns=None, filepath_or_buffer=None, usecols=CSV_COLUMNS,
+                 low_memory=False, encoding="utf-8", use_cache=False):
         """
         Initializes MovieDataSet object.
 
@@ -25,28 +74,201 @@ class MovieDataSet(pd.DataFrame):
             data: Data as DataFrame, dict, or list of dicts.
             index: Index.
             columns: Columns.
-            filepath_or_buffer: File path or object to read.
-            low_memory (bool, optional): Whether to use low memory mode while reading the CSV file.
-                Defaults to False.
+            filepath_or_buffer: File path or object to read. The CSV file is parsed with PyArrow,
+                converting the columns in CSV_COLUMN_TYPES while parsing. Malformed rows are skipped.
+            usecols (list(str), optional): Columns to read from the CSV file, the other columns are skipped
+                without being parsed. None reads every column. Defaults to CSV_COLUMNS.
+            low_memory (bool, optional): Kept for compatibility with pd.read_csv, PyArrow always
+                reads the file in blocks. Defaults to False.
             encoding (str, optional): The encoding of the file.
                 Defaults to "utf-8".
+            use_cache (bool, optional): Whether to cache the cleaned dataset in a Parquet file next to
+                the CSV file. clean_dataset returns the cached dataset when the cache is newer than the
+                CSV file and was built with the same usecols, encoding and drop_columns, otherwise it
+                cleans the dataset and replaces the cache. Defaults to False.
         """
+        self._cache_path = None
         if filepath_or_buffer:
+            if use_cache and isinstance(filepath_or_buffer, (str, os.PathLike)) \
+                    and str(filepath_or_buffer).endswith(".csv"):
+                self._cache_path = Path(filepath_or_buffer).with_suffix(".parquet")
+                self._csv_path = Path(filepath_or_buffer)
+                self._cache_options = {"usecols": list(usecols) if usecols is not None else None,
+                                       "encoding": encoding}
+            # Rows broken over several lines have the wrong number of fields, they are
+            # skipped and counted
+            skipped_rows = []
+
+            def skip_row(row):
+                skipped_rows.append(row.number)
+                return "skip"
+
             try:
-                super().__init__(pd.read_csv(
-                    filepath_or_buffer, low_memory=low_memory, encoding=encoding))
+                table = pacsv.read_csv(
+                    filepath_or_buffer,
+                    read_options=pacsv.ReadOptions(encoding=encoding),
+                    parse_options=pacsv.ParseOptions(
+                        newlines_in_values=True, invalid_row_handler=skip_row),
+                    convert_options=pacsv.ConvertOptions(
+                        column_types=CSV_COLUMN_TYPES, strings_can_be_null=True, include_columns=usecols))
+                self._df = table.to_pandas(
+                    types_mapper=pd.ArrowDtype, self_destruct=True, split_blocks=True)
+                if skipped_rows:
+                    logger.warning(f"Skipped {len(skipped_rows)} malformed rows of {filepath_or_buffer}")
             except FileNotFoundError as e:
-                logging.error(f"File not found: {e.filename}")
+                logger.error(f"File not found: {e.filename or filepath_or_buffer}")
                 raise
             except PermissionError as e:
-                logging.error(f"Permission denied: {e.filename}")
+                logger.error(f"Permission denied: {e.filename or filepath_or_buffer}")
                 raise
         else:
-            super().__init__(data=data, index=index, columns=columns)
+            self._df = pd.DataFrame(data=data, index=index, columns=columns)
+
+        # The frame is never modified in place, df only hands out copies of it, so the
+        # column names are looked up once
+        self._cols = frozenset(self._df.columns)
+
+    @property
+    def df(self):
+        """
+        pd.DataFrame: A shallow copy of the underlying DataFrame. The data is not copied, but adding,
+            removing or assigning columns on it does not change the dataset.
+        """
+        return self._df.copy(deep=False)
+
+    @property
+    def columns(self):
+        """
+        pd.Index: The column labels of the DataFrame.
+        """
+        return self._df.columns
+
+    def __getitem__(self, key):
+        return self._df[key]
+
+    def __len__(self):
+        return len(self._df)
+
+    def info(self, *args, **kwargs):
+        """
+        Print a concise summary of the DataFrame, see pd.DataFrame.info.
+        """
+        return self._df.info(*args, **kwargs)
+
+    def _cache_key(self, drop_columns):
+        """
+        Arguments the cleaned dataset is built with, stored in the Parquet cache metadata.
+
+        Parameters:
+            drop_columns (list(str)): The columns removed by clean_dataset.
+
+        Returns:
+            dict: The 'usecols', 'encoding' and 'drop_columns' of the dataset.
+        """
+        return {**self._cache_options, "drop_columns": list(drop_columns)}
+
+    def _read_cache(self, drop_columns):
+        """
+        Read the cleaned dataset from the Parquet cache.
 
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.INFO)
-        self.logger.addHandler(logging.StreamHandler())
+        Parameters:
+            drop_columns (list(str)): The columns removed by clean_dataset.
+
+        Returns:
+            pd.DataFrame: The cached cleaned DataFrame, or None when there is no cache, it is older
+                than the CSV file, it was built with other arguments or it cannot be read.
+        """
+        if not self._cache_path.exists() or self._cache_path.stat().st_mtime < self._csv_path.stat().st_mtime:
+            return None
+
+        # A corrupt or truncated cache is a cache miss, the dataset is cleaned again and the
+        # cache replaced
+        try:
+            cache_key = (pq.read_schema(self._cache_path).metadata or {}).get(CACHE_METADATA_KEY)
+            if not cache_key or json.loads(cache_key) != self._cache_key(drop_columns):
+                return None
+
+            logger.info(f"Reading cleaned dataset from {self._cache_path} ...")
+            # The columns are read with Arrow dtypes like the CSV file, the categoricals are decoded
+            # so _apply_cleaned_dtypes encodes them exactly like clean_dataset. The Arrow dtypes
+            # also apply to the index, it is restored to int64
+            table = pq.read_table(self._cache_path)
+            table = table.cast(pa.schema(
+                [field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+                 for field in table.schema], metadata=table.schema.metadata))
+            cached = table.to_pandas(types_mapper=pd.ArrowDtype)
+            return self._apply_cleaned_dtypes(cached.set_axis(cached.index.astype(np.int64)))
+        except Exception as e:
+            logger.warning(f"Could not read the cache file {self._cache_path}, cleaning the dataset: {e}")
+            return None
+
+    def _write_cache(self, cleaned, drop_columns):
+        """
+        Write the cleaned dataset to the Parquet cache, along with the arguments it was built with.
+
+        Parameters:
+            cleaned (MovieDataSet): The cleaned dataset.
+            drop_columns (list(str)): The columns removed by clean_dataset.
+        """
+        table = pa.Table.from_pandas(cleaned._df)
+        table = table.replace_schema_metadata(
+            {**table.schema.metadata, CACHE_METADATA_KEY: json.dumps(self._cache_key(drop_columns))})
+
+        # Write to a temporary file next to the cache and move it over the cache, so a failed
+        # write never leaves a partial cache behind
+        fd, temp_path = tempfile.mkstemp(
+            dir=self._cache_path.parent, prefix=f".{self._cache_path.name}.", suffix=".tmp")
+        os.close(fd)
+        try:
+            pq.write_table(table, temp_path, compression="zstd")
+            os.replace(temp_path, self._cache_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def _coerce_column_types(df):
+        """
+        Convert the columns in CSV_COLUMN_TYPES which are not typed yet.
+
+        Frames parsed from the CSV file are already typed and returned as they are, frames passed
+        as data may still hold strings. Values which cannot be converted become NaN or NaT.
+
+        Args:
+            df (pd.DataFrame): The DataFrame to convert.
+
+        Returns:
+            pd.DataFrame: The DataFrame with numeric and datetime columns.
+        """
+        converted = {}
+        for column, arrow_type in CSV_COLUMN_TYPES.items():
+            if column not in df.columns:
+                continue
+            if pa.types.is_timestamp(arrow_type) and not pd.api.types.is_datetime64_any_dtype(df[column]):
+                converted[column] = pd.to_datetime(df[column], format="%Y-%m-%d", errors="coerce")
+            elif (pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type)) \
+                    and not pd.api.types.is_numeric_dtype(df[column]):
+                converted[column] = pd.to_numeric(df[column], errors="coerce")
+        return df.assign(**converted)
+
+    @staticmethod
+    def _apply_cleaned_dtypes(df):
+        """
+        Cast the columns derived by clean_dataset to their final dtypes.
+
+        Used by clean_dataset and when reading the Parquet cache, so a dataset read from the cache
+        has the same dtypes as a freshly cleaned one.
+
+        Args:
+            df (pd.DataFrame): The cleaned DataFrame.
+
+        Returns:
+            pd.DataFrame: The DataFrame with 'release_year' as int16, 'genres' as GENRES_TYPE and
+                the CATEGORY_COLUMNS as categoricals.
+        """
+        dtypes = {COLUMN_RELEASE_YEAR: "int16", COLUMN_GENRES: pd.ArrowDtype(GENRES_TYPE)}
+        dtypes.update({column: "category" for column in CATEGORY_COLUMNS})
+        return df.astype({column: dtype for column, dtype in dtypes.items() if column in df.columns})
 
     def _log_error_and_return(self, message):
         """
@@ -55,7 +277,7 @@ class MovieDataSet(pd.DataFrame):
         Parameters:
             message (str): Error message to log.
         """
-        self.logger.error(message)
+        logger.error(message)
         return None
 
     def get_unique_movies_count(self, column=COLUMN_ID):
@@ -66,11 +288,16 @@ class MovieDataSet(pd.DataFrame):
             column (str, optional): The column containing the unique identifier for each movie.
                 Defaults to 'id'.
         """
-        if column not in self.columns:
+        if column not in self._cols:
             return self._log_error_and_return(f"'{column}' column not found.")
 
-        unique_movies = self[column].nunique()
-        # self.logger.info(f"Number of unique movies: {unique_movies}")
+        # Arrow backed columns are counted with Arrow's hash kernel
+        values = self._df[column]
+        if isinstance(values.dtype, pd.ArrowDtype):
+            unique_movies = pc.count_distinct(pa.array(values)).as_py()
+        else:
+            unique_movies = values.nunique()
+        # logger.info(f"Number of unique movies: {unique_movies}")
         return unique_movies
 
     def get_average_rating_by_column(self, column=COLUMN_VOTE_AVERAGE):
@@ -81,11 +308,24 @@ class MovieDataSet(pd.DataFrame):
             column (str, optional): The column containing the ratings for each movie.
                 Defaults to 'vote_average'.
         """
-        if column not in self.columns:
+        if column not in self._cols:
             return self._log_error_and_return(f"Error: '{column}' column not found.")
 
-        average = self[column].mean()
-        # self.logger.info(f"Average rating for all movies, based on the '{
+        # Average with Arrow's or NumPy's kernel, skipping missing ratings
+        values = self._df[column]
+        if isinstance(values.dtype, pd.ArrowDtype):
+            average = pc.mean(pa.array(values)).as_py()
+        elif values.dtype.kind == "f":
+            ratings = values.to_numpy()
+            # np.nanmean warns on a column without ratings, it is handled below instead
+            average = float(np.nanmean(ratings)) if not np.isnan(ratings).all() else None
+        else:
+            average = values.mean()
+
+        # Both kernels give None for an empty or all-missing column, Series.mean returns NaN
+        if average is None:
+            average = np.nan
+        # logger.info(f"Average rating for all movies, based on the '{
         #                  column}': {average:.2f}")
         return average
 
@@ -97,22 +337,32 @@ class MovieDataSet(pd.DataFrame):
             released_column (str, optional): Name of the column which contains the information for movie release dates.
                 Defaults to 'release_date'.
         """
-        if released_column not in self.columns:
+        if released_column not in self._cols:
             return self._log_error_and_return(f"Error: '{released_column}' column not found.")
 
-        # Extract year from release_date column
-        self['release_year'] = pd.to_datetime(
-            self[released_column]).dt.strftime("%Y")
-
-        # Count occurrences of films for each year
-        films_per_year = self['release_year'].value_counts().sort_index()
+        # Reuse the years derived by clean_dataset, otherwise extract them
+        # from the release date column as integers
+        if released_column == COLUMN_RELEASE_DATE and COLUMN_RELEASE_YEAR in self._cols:
+            years = self._df[COLUMN_RELEASE_YEAR].dropna().to_numpy(dtype=np.int32)
+        else:
+            years = pd.to_datetime(
+                self._df[released_column], format="%Y-%m-%d", errors="coerce", cache=True
+            ).dt.year.dropna().to_numpy(dtype=np.int32)
+
+        # Count occurrences of films for each year, counting the offsets from the
+        # first year avoids hashing and sorting the years
+        first_year = years.min() if years.size else 0
+        counts = np.bincount(years - first_year)
+        films_per_year = pd.Series(counts, index=pd.RangeIndex(
+            first_year, first_year + counts.size, name="release_year"), name="count")
+        films_per_year = films_per_year[films_per_year > 0]
 
         # Print the number of films released in each year
-        # self.logger.info(f"Number of films released in each year:\n{
+        # logger.info(f"Number of films released in each year:\n{
         #                  films_per_year}")
         return films_per_year
 
-    def save_json(self, file_path, orient="records"):
+    def save_json(self, file_path, orient="records", lines=False):
         """
         Save the DataFrame to a JSON file.
 
@@ -120,29 +370,76 @@ class MovieDataSet(pd.DataFrame):
             file_path (str): The path to the JSON file to save.
             orient (str, optional): The format of the JSON file.
                 Defaults to 'records'.
+            lines (bool, optional): Whether to write one JSON object per line (NDJSON).
+                Only supported with orient='records'. Defaults to False.
         """
         try:
-            self.to_json(file_path, orient=orient)
-            self.logger.info(f"File {file_path} successfully written.")
+            if orient == "records":
+                # Serialize the rows of the Arrow table with orjson, writing dates as
+                # epoch milliseconds and floats rounded to 10 decimals like
+                # DataFrame.to_json, so float32 values are not written with the noise
+                # digits of their float64 widening. The rows are converted and
+                # written in batches, so only one batch is held as Python objects
+                table = pa.Table.from_pandas(self._df, preserve_index=False)
+                for i, field in enumerate(table.schema):
+                    if pa.types.is_timestamp(field.type):
+                        table = table.set_column(i, field.name, table.column(i).cast(
+                            pa.timestamp("ms"), safe=False).cast(pa.int64()))
+                    elif pa.types.is_floating(field.type):
+                        table = table.set_column(i, field.name, pc.round(
+                            table.column(i).cast(pa.float64()), ndigits=JSON_DOUBLE_PRECISION))
+                with open(file_path, "wb") as f:
+                    if not lines:
+                        f.write(b"[")
+                    separator = b""
+                    for batch in table.to_batches(max_chunksize=JSON_BATCH_SIZE):
+                        rows = batch.to_pylist()
+                        if not rows:
+                            continue
+                        if lines:
+                            f.writelines(orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+                        else:
+                            # Strip the brackets of the batch, the rows are written into one array
+                            f.write(separator)
+                            f.write(orjson.dumps(rows)[1:-1])
+                            separator = b","
+                    if not lines:
+                        f.write(b"]")
+            else:
+                self._df.to_json(file_path, orient=orient, lines=lines)
+            logger.info(f"File {file_path} successfully written.")
         except Exception as e:
-            self.logger.error(f"Error writing to file: {e}")
+            logger.error(f"Error writing to file: {e}")
             raise
 
-    def _parsing_stringified_json(self, cell):
+    def _parsing_stringified_json_column(self, column):
         """
-        Parse stringified JSON in a DataFrame cell.
+        Parse a column of stringified JSON in one pass.
+
+        Each distinct cell is decoded only once and the results are mapped back onto the
+        column. Cells without double quotes are normalised to JSON quoting and decoded with the
+        C JSON decoder, falling back to ast.literal_eval for cells which are not valid JSON after
+        that. Cells with double quotes go straight to ast.literal_eval, as swapping their quotes
+        could change the value.
 
         Args:
-            cell (str): The cell containing the stringified JSON.
+            column (pd.Series): The column containing the stringified JSON.
 
         Returns:
-            Parsed JSON or np.nan if the cell is empty or NaN.
+            pd.Series: Parsed JSON, or np.nan where the cell is empty or NaN.
         """
-        cell = ast.literal_eval(cell)
-        if cell == [] or (isinstance(cell, float) and np.isnan(cell)):
-            return np.nan
-        else:
-            return cell
+        parsed = {}
+        for cell in column.dropna().unique():
+            if '"' in cell:
+                value = ast.literal_eval(cell)
+            else:
+                try:
+                    value = json.loads(cell.replace("'", '"'))
+                except ValueError:
+                    value = ast.literal_eval(cell)
+            parsed[cell] = value if value != [] else np.nan
+
+        return column.map(parsed)
 
     def clean_dataset(self, drop_columns=["homepage", "poster_path", "video", "imdb_id", "overview", "original_title",
                                           "spoken_languages", "tagline", "adult", "belongs_to_collection", "status", "runtime", "production_companies", "production_countries"]):
@@ -151,60 +448,58 @@ class MovieDataSet(pd.DataFrame):
 
         Parameters:
             drop_columns (list(str), optional): List of name of the columns which will be remobed entierly.
+                Columns which were not read from the CSV file are ignored.
                 Defaults to ["homepage", "poster_path", "video", "imdb_id", "overview", "original_title",
                             "spoken_languages", "tagline", "adult", "belongs_to_collection", "status",
                             "runtime", "production_companies", "production_countries"].
         Returns:
-            MovieDataSet: The cleaned DataFrame.
+            MovieDataSet: The cleaned dataset.
         """
+        cached = self._read_cache(drop_columns) if self._cache_path else None
+        if cached is not None:
+            cleaned = MovieDataSet(data=cached)
+            logger.info("Information of final dataset")
+            cleaned.info()
+            return cleaned
 
         try:
-            self.logger.info(f"Removing columns: {drop_columns} ...")
-            self.drop(drop_columns, axis=1, inplace=True)
-
-            self.logger.info("Removing duplicated records...")
-            self.drop_duplicates(keep='first', inplace=True)
-
-            self.logger.info("Removing empty rows ...")
-            self.dropna(how="all", inplace=True)
-
-            self.logger.info("Replacing empty titles with NaN ...")
-            self.dropna(subset=["title"], inplace=True)
-
-            self.logger.info("Converting 'id' column to integer ...")
-            self["id"] = pd.to_numeric(
-                self['id'], errors='coerce', downcast="integer")
-
-            self.logger.info("Converting 'popularity' column to float ...")
-            self["popularity"] = pd.to_numeric(
-                self['popularity'], errors='coerce', downcast="float")
-
-            self.logger.info("Converting 'budget' column to float ...")
-            self["budget"] = pd.to_numeric(
-                self['budget'], errors='coerce', downcast="float")
-
-            self.logger.info("Replacing empty 'release_date' with NaN ...")
-            self.dropna(subset=["release_date"], inplace=True)
-
-            self.logger.info(
-                "Replacing empty 'original_language' with NaN ...")
-            self.dropna(subset=["original_language"], inplace=True)
-
-            self.logger.info("Converting 'release_date' values to datetime")
-            self['release_date'] = pd.to_datetime(self['release_date'])
-
-            self.logger.info(
-                "Creating column 'release_year' with year property of 'release_date' in string format ...")
-            self['release_year'] = self['release_date'].dt.strftime("%Y")
-
-            self.logger.info("Parsing content of the 'genres' column")
-            self['genres'] = self['genres'].apply(
-                self._parsing_stringified_json)
-
-            self.logger.info("Information of final dataset")
-            self.info()
-
-            return self
+            # The steps run as one pipeline, so the progress is logged around it as a whole
+            logger.info(
+                "Cleaning dataset: removing duplicated, empty and incomplete records and parsing the 'genres' column ...")
+
+            # Express every cleaning step as a single chained pipeline, so no
+            # step mutates the frame in place and the derived columns are
+            # assigned in one go instead of one column rewrite per column.
+            # Duplicated, empty and incomplete rows are removed with one
+            # combined mask, so the frame is filtered only once
+            cleaned = (
+                self._df.drop(columns=drop_columns, errors="ignore")
+                .pipe(self._coerce_column_types)
+                .loc[lambda df: ~df.duplicated(keep='first')
+                     & df.notna().any(axis=1)
+                     & df[["title", "release_date", "original_language"]].notna().all(axis=1)]
+                .assign(
+                    release_year=lambda df: df['release_date'].dt.year,
+                    genres=lambda df: self._parsing_stringified_json_column(
+                        df['genres']),
+                )
+                .pipe(self._apply_cleaned_dtypes)
+            )
+            cleaned = MovieDataSet(data=cleaned)
+            logger.info(f"Dataset cleaned, {len(cleaned)} of {len(self)} records kept")
+
+            if self._cache_path:
+                # The cache only speeds up the next run, failing to write it is not an error
+                try:
+                    logger.info(f"Writing cleaned dataset to {self._cache_path} ...")
+                    self._write_cache(cleaned, drop_columns)
+                except Exception as e:
+                    logger.warning(f"Could not write the cache file {self._cache_path}: {e}")
+
+            logger.info("Information of final dataset")
+            cleaned.info()
+
+            return cleaned
         except Exception as e:
-            self.logger.error(
+            logger.error(
                 f"An error occurred while cleaning the dataset: {e}")
@@ -13,7 +13,9 @@ setup(
     install_requires=[
         # List of your dependencies
         'numpy',
-        'pandas'
+        'pandas',
+        'pyarrow',
+        'orjson'
     ],
     classifiers=[
         'Programming Language :: Python :: 3',